@@ -0,0 +1,21 @@
+# Gunicorn settings for the NDVI app
+import os
+import subprocess
+import sys
+
+bind = "0.0.0.0:5000"
+
+# NDVI requests spend almost all of their time waiting on Sentinel Hub, so each
+# worker runs a pool of threads to keep many of those calls in flight at once
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+# Leave room for the 60 s Sentinel Hub client timeout
+timeout = 90
+
+def on_starting(server):
+    """Migrate the database once, before any worker imports the app"""
+    # A separate process keeps database connections out of the master, which
+    # would otherwise share them with every forked worker
+    subprocess.run([sys.executable, "-m", "flask", "--app", "main", "migrate"], check=True)
@@ -1,22 +1,35 @@
 import os
-import requests
+import httpx
+import csv
+import functools
+import hashlib
+import html
 import io
-import json
-from datetime import datetime
-from flask import Flask, request, Response, make_response, jsonify, send_from_directory, redirect, url_for
+import msgspec
+import operator
+import orjson
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Annotated
+from flask import Flask, request, Response, make_response, jsonify, send_from_directory, redirect, url_for, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask_caching import Cache
+from flask_compress import Compress
+from cachetools import TTLCache
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload, with_loader_criteria
 
 # Import scientific libraries (pip-installed)
 import numpy as np
-import pandas as pd
+from pyproj import Geod
+from shapely.errors import ShapelyError
+from shapely.geometry import shape
 
 # Set availability flags for compatibility
 NUMPY_AVAILABLE = True
-PANDAS_AVAILABLE = True
-
-# Disable rasterio to use alternative approach
-RASTERIO_AVAILABLE = False
-print("Using alternative approach for NDVI processing without rasterio.")
 
 # Initialize Flask app
 app = Flask(__name__, static_folder="static")
@@ -25,10 +38,39 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev_key_for_testing")
 # Configure database connection
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Pool sized for gthread workers: each worker thread may hold a connection
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
+    "pool_size": 20,
+    "max_overflow": 40,
+    "pool_timeout": 10,
+    # JSON/JSONB columns (parcel geometry) go through orjson
+    "json_serializer": lambda obj: orjson.dumps(obj).decode(),
+    "json_deserializer": orjson.loads,
 }
+if (app.config["SQLALCHEMY_DATABASE_URI"] or "").startswith("postgres"):
+    # Cap runaway queries so they can't hold pooled connections indefinitely
+    statement_timeout = os.environ.get("DB_STATEMENT_TIMEOUT_MS", "5000")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {
+        "options": f"-c statement_timeout={statement_timeout}"
+    }
+
+# Cache Sentinel Hub responses on disk so repeated parcel/date lookups skip the API
+cache = Cache(app, config={
+    "CACHE_TYPE": "FileSystemCache",
+    "CACHE_DIR": os.environ.get("NDVI_CACHE_DIR", "/tmp/ndvi"),
+    "CACHE_DEFAULT_TIMEOUT": 86400,
+})
+
+# Compress JSON/HTML responses. ETags on compressible routes are weak, which
+# Flask-Compress leaves untouched, so routes can answer 304 before building
+# (and compressing) a body
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_ALGORITHM_STREAMING"] = ["br", "deflate"]
+app.config["COMPRESS_MIN_SIZE"] = 1024
+app.config["COMPRESS_LEVEL"] = 4
+Compress(app)
 
 # Import and initialize database models
 from models import db, User, Parcel, NDVIAnalysis
@@ -41,30 +83,156 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Short-lived cache of loaded users, so the XHRs fired by one page load don't
+# each query the user row again
+_user_cache = TTLCache(maxsize=1024, ttl=60)
+_user_cache_lock = threading.Lock()
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    with _user_cache_lock:
+        user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user = User.query.get(int(user_id))
+    if user is not None:
+        # Detach the instance so commits in later requests can't expire it
+        db.session.expunge(user)
+        with _user_cache_lock:
+            _user_cache[user_id] = user
+    return user
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes migrations
+MIGRATION_LOCK_ID = 7321604
+
+def migrate_schema():
+    """
+    Create missing tables and bring tables created by older versions up to
+    date, since db.create_all() only creates missing tables. Every step is
+    a no-op once applied, and on PostgreSQL the whole migration holds an
+    advisory lock, so concurrent runs from several instances wait for each
+    other instead of colliding
+    """
+    with db.engine.begin() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            # Table rewrites can outlast the request statement_timeout
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+        
+        db.metadata.create_all(conn)
+        
+        inspector = inspect(conn)
+        analysis_columns = {c["name"] for c in inspector.get_columns("ndvi_analysis")}
+        analysis_indexes = {i["name"] for i in inspector.get_indexes("ndvi_analysis")}
+        # SQLite has no ADD COLUMN IF NOT EXISTS, so it relies on the inspector
+        add_column = "ADD COLUMN IF NOT EXISTS" if postgres else "ADD COLUMN"
+        
+        if "updated_at" not in analysis_columns:
+            print("Adding ndvi_analysis.updated_at")
+            conn.execute(text(f"ALTER TABLE ndvi_analysis {add_column} updated_at TIMESTAMP"))
+            conn.execute(text("UPDATE ndvi_analysis SET updated_at = created_at WHERE updated_at IS NULL"))
+        
+        if "user_id" not in analysis_columns:
+            print("Adding ndvi_analysis.user_id")
+            conn.execute(text(f"ALTER TABLE ndvi_analysis {add_column} user_id INTEGER REFERENCES \"user\" (id)"))
+            conn.execute(text(
+                "UPDATE ndvi_analysis SET user_id = "
+                "(SELECT parcel.user_id FROM parcel WHERE parcel.id = ndvi_analysis.parcel_id) "
+                "WHERE user_id IS NULL"
+            ))
+        
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_ndvi_analysis_user_id ON ndvi_analysis (user_id)"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_parcel_user_id ON parcel (user_id, id)"))
+        
+        if "ix_ndvi_parcel_date" not in analysis_indexes:
+            # Keep the newest analysis of any duplicated parcel/date pair so the
+            # unique index can be built
+            print("Creating unique index ix_ndvi_parcel_date")
+            conn.execute(text(
+                "DELETE FROM ndvi_analysis WHERE id NOT IN "
+                "(SELECT MAX(id) FROM ndvi_analysis GROUP BY parcel_id, analysis_date)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_ndvi_parcel_date "
+                "ON ndvi_analysis (parcel_id, analysis_date)"
+            ))
+        
+        if postgres:
+            data_type = conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'parcel' AND column_name = 'geometry'"
+            )).scalar()
+            if data_type == "text":
+                print("Converting parcel.geometry to JSONB")
+                conn.execute(text(
+                    "ALTER TABLE parcel ALTER COLUMN geometry TYPE jsonb USING geometry::jsonb"
+                ))
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Create missing tables and bring existing ones up to date"""
+    migrate_schema()
+
+# Recently verified passwords, so login retries and repeat sign-ins within a
+# short window skip the deliberately slow password hash. Entries are keyed
+# by a per-process keyed blake2b of the stored hash and the password, so no
+# plaintext is kept and changing the password invalidates them. The trade-off
+# is that a correct password stays accepted from memory for up to 30 seconds.
+_password_cache = TTLCache(maxsize=1024, ttl=30)
+_password_cache_lock = threading.Lock()
+_PASSWORD_CACHE_KEY = os.urandom(32)
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+def check_password_cached(user, password):
+    """Check a user's password, remembering successful checks briefly"""
+    h = hashlib.blake2b(key=_PASSWORD_CACHE_KEY, digest_size=16)
+    h.update(user.password_hash.encode())
+    h.update(b"\0")
+    h.update(password.encode())
+    key = h.digest()
+    
+    with _password_cache_lock:
+        if key in _password_cache:
+            return True
+    
+    if not user.check_password(password):
+        return False
+    with _password_cache_lock:
+        _password_cache[key] = True
+    return True
 
 # Sentinel Hub OAuth and API configuration
 SENTINEL_CLIENT_ID = os.getenv("SENTINEL_CLIENT_ID", "be85857b-82df-4553-9d12-6d3a25324500")
 SENTINEL_CLIENT_SECRET = os.getenv("SENTINEL_CLIENT_SECRET", "ZoEPmPYYfk5DqC93vUkTJfGA46psfIJO")
 SENTINEL_OAUTH_URL = "https://services.sentinel-hub.com/oauth/token"
 SENTINEL_PROCESS_URL = "https://services.sentinel-hub.com/api/v1/process"
+SENTINEL_STATISTICS_URL = "https://services.sentinel-hub.com/api/v1/statistics"
 
 print(f"Using Sentinel Hub client ID: {SENTINEL_CLIENT_ID}")
 
+# Shared HTTP/2 client so Sentinel Hub calls reuse pooled keep-alive connections
+# instead of paying a TCP+TLS handshake on every request, and concurrent calls
+# from different worker threads multiplex over the same connection
+http_client = httpx.Client(
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+    ),
+    timeout=60.0
+)
+
 # Function to get available instances
 def get_sentinel_instances():
     """Get list of available Sentinel Hub instances"""
     try:
         config_url = "https://services.sentinel-hub.com/configuration/v1/wms/instances"
-        response = requests.get(
+        response = http_client.get(
             config_url,
-            headers={"Authorization": f"Bearer {SENTINEL_ACCESS_TOKEN}"}
+            headers=get_headers()
         )
         
         if response.status_code == 200:
@@ -88,51 +256,543 @@ def get_sentinel_instances():
 SENTINEL_INSTANCE_ID = os.getenv("SENTINEL_INSTANCE_ID", "52e4fc90-be93-4ad1-a190-e9b97a7c13f7")
 print(f"Using Sentinel Hub Instance ID: {SENTINEL_INSTANCE_ID}")
 
+# Cached OAuth token, shared by all worker threads and refreshed lazily
+_token_cache = {"token": None, "exp": 0.0}
+_token_lock = threading.Lock()
+
 # Function to get OAuth token
-def get_sentinel_token():
-    """Get access token for Sentinel Hub API using OAuth"""
-    try:
-        response = requests.post(
-            SENTINEL_OAUTH_URL,
-            data={
-                "grant_type": "client_credentials",
-                "client_id": SENTINEL_CLIENT_ID,
-                "client_secret": SENTINEL_CLIENT_SECRET
-            },
-            headers={
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-        )
+def get_sentinel_token(stale_token=None):
+    """
+    Get access token for Sentinel Hub API using OAuth
+    
+    The token is cached until 60 seconds before it expires. Passing the token
+    that was just rejected as stale_token forces a refresh, unless another
+    thread has already replaced it.
+    """
+    with _token_lock:
+        token = _token_cache["token"]
+        if token and token != stale_token and time.monotonic() < _token_cache["exp"] - 60:
+            return token
         
-        if response.status_code == 200:
-            data = response.json()
-            access_token = data.get("access_token")
-            print("Successfully obtained Sentinel Hub access token")
-            return access_token
-        else:
-            print(f"Failed to get Sentinel Hub access token: {response.text}")
+        try:
+            response = http_client.post(
+                SENTINEL_OAUTH_URL,
+                data={
+                    "grant_type": "client_credentials",
+                    "client_id": SENTINEL_CLIENT_ID,
+                    "client_secret": SENTINEL_CLIENT_SECRET
+                },
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded"
+                }
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                _token_cache["token"] = data.get("access_token")
+                _token_cache["exp"] = time.monotonic() + data.get("expires_in", 3600)
+                print("Successfully obtained Sentinel Hub access token")
+                return _token_cache["token"]
+            else:
+                print(f"Failed to get Sentinel Hub access token: {response.text}")
+                return None
+        except Exception as e:
+            print(f"Error getting Sentinel Hub access token: {str(e)}")
             return None
-    except Exception as e:
-        print(f"Error getting Sentinel Hub access token: {str(e)}")
+
+def get_headers(token=None):
+    """Build the Authorization headers for Sentinel Hub API requests"""
+    return {"Authorization": f"Bearer {token or get_sentinel_token()}"}
+
+def sentinel_process(payload, stream=False, url=SENTINEL_PROCESS_URL):
+    """
+    POST a request to a Sentinel Hub API, retrying once with a fresh token on 401
+    
+    Defaults to the Process API; pass url to target another endpoint. The
+    payload may be a dict or already-serialized JSON bytes.
+    
+    With stream=True the body is left unread; the caller must read or close
+    the response.
+    """
+    body = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+    token = get_sentinel_token()
+    
+    for attempt in range(2):
+        headers = {**get_headers(token), "Content-Type": "application/json"}
+        upstream_request = http_client.build_request("POST", url, content=body, headers=headers)
+        response = http_client.send(upstream_request, stream=stream)
+        if response.status_code != 401 or attempt:
+            return response
+        response.close()
+        token = get_sentinel_token(stale_token=token)
+
+class SentinelHubError(Exception):
+    """Raised when the Sentinel Hub API answers with a non-200 status"""
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+def sentinel_cache_key(parcel_geojson, date, fmt, evalscript):
+    """
+    Build a cache key from the raw parcel GeoJSON, date, output format and evalscript
+    
+    The GeoJSON is hashed as sent rather than re-serialized, so only
+    byte-identical requests share an entry.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(parcel_geojson.encode())
+    h.update(date.encode())
+    h.update(fmt.encode())
+    h.update(evalscript.encode())
+    return f"sentinel:{h.hexdigest()}"
+
+def build_payload(geometry, date, fmt, evalscript, identifier="default"):
+    """Build a Process API request for one day of Sentinel-2 L2A data over a geometry"""
+    return {
+        "input": {
+            "bounds": {"geometry": geometry},
+            "data": [{
+                "type": "sentinel-2-l2a",
+                "dataFilter": {"timeRange": {
+                    "from": f"{date}T00:00:00Z",
+                    "to": f"{date}T23:59:59Z"
+                }}
+            }]
+        },
+        "output": {
+            "width": 512,
+            "height": 512,
+            "responses": [{"identifier": identifier, "format": {"type": fmt}}]
+        },
+        "evalscript": evalscript
+    }
+
+def stream_sentinel(parcel_geojson, date, script_id):
+    """
+    Stream a Process API response for a parcel and date
+    
+    Cached responses are served from the cache. Otherwise the upstream body
+    is passed through chunk by chunk and cached once it has been read in full.
+    
+    The iterator may never be started (HEAD requests, early disconnects), so
+    the caller must register the returned close callable with the response.
+    
+    Returns:
+        Tuple of (chunk iterator, content length or None, close callable or None)
+        
+    Raises:
+        SentinelHubError: If Sentinel Hub returns a non-200 response
+    """
+    fmt, evalscript, identifier = SENTINEL_REQUESTS[script_id]
+    key = sentinel_cache_key(parcel_geojson, date, f"{identifier}:{fmt}", evalscript)
+    content = cache.get(key)
+    if content is not None:
+        return iter((content,)), len(content), None
+    
+    response = sentinel_process(payload_bytes(parcel_geojson, date, script_id), stream=True)
+    if response.status_code != 200:
+        response.read()
+        response.close()
+        raise SentinelHubError(response.status_code, response.text)
+    
+    # Content-Length only matches the decoded chunks if the body isn't compressed
+    length = None
+    if "content-encoding" not in response.headers:
+        length = response.headers.get("content-length")
+    
+    def chunks():
+        parts = []
+        try:
+            for chunk in response.iter_bytes(64 * 1024):
+                parts.append(chunk)
+                yield chunk
+        finally:
+            response.close()
+        cache.set(key, b"".join(parts))
+    
+    return chunks(), length, response.close
+
+# Parcel bounding-box limits in square degrees; anything outside these is
+# either degenerate or far beyond what a single field request should cover
+MIN_PARCEL_BBOX_DEG2 = 1e-8
+MAX_PARCEL_BBOX_DEG2 = 1.0
+
+def validate_parcel(geojson):
+    """
+    Check that a parcel FeatureCollection is worth sending to Sentinel Hub
+    
+    Returns:
+        Bounding box of the first feature as (min_x, min_y, max_x, max_y)
+        
+    Raises:
+        ValueError: If the geometry is missing, malformed or has an absurd extent
+    """
+    try:
+        coordinates = geojson["features"][0]["geometry"]["coordinates"][0]
+        coords = np.asarray(coordinates, dtype=np.float64)
+    except (KeyError, IndexError, TypeError, ValueError):
+        raise ValueError("expected a FeatureCollection with a polygon feature")
+    
+    if coords.ndim < 2 or coords.shape[-1] < 2:
+        raise ValueError("polygon coordinates are malformed")
+    coords = coords.reshape(-1, coords.shape[-1])[:, :2]
+    if len(coords) < 4:
+        raise ValueError("polygon needs at least 4 vertices")
+    if not np.isfinite(coords).all():
+        raise ValueError("polygon coordinates must be finite numbers")
+    
+    min_xy = coords.min(axis=0)
+    max_xy = coords.max(axis=0)
+    area_deg2 = float(np.prod(max_xy - min_xy))
+    if area_deg2 < MIN_PARCEL_BBOX_DEG2:
+        raise ValueError("parcel area is too small")
+    if area_deg2 > MAX_PARCEL_BBOX_DEG2:
+        raise ValueError("parcel area is too large")
+    
+    return (float(min_xy[0]), float(min_xy[1]), float(max_xy[0]), float(max_xy[1]))
+
+# WGS84 ellipsoid for geodesic parcel areas
+_geod = Geod(ellps="WGS84")
+
+def geometry_area_hectares(geojson):
+    """
+    Geodesic area of a GeoJSON geometry, Feature or FeatureCollection
+    
+    Returns:
+        Area in hectares, or None if the GeoJSON can't be parsed
+    """
+    try:
+        if geojson.get("type") == "FeatureCollection":
+            geometries = [feature["geometry"] for feature in geojson["features"]]
+        elif geojson.get("type") == "Feature":
+            geometries = [geojson["geometry"]]
+        else:
+            geometries = [geojson]
+        area_m2 = sum(abs(_geod.geometry_area_perimeter(shape(g))[0]) for g in geometries if g)
+    except (AttributeError, KeyError, TypeError, ValueError, ShapelyError):
         return None
+    return area_m2 / 10000
 
-# Get token at startup
-SENTINEL_ACCESS_TOKEN = get_sentinel_token() or "default_access_token"
+# Evalscript rendering NDVI as a red-yellow-green PNG
+NDVI_IMAGE_EVALSCRIPT = """
+    //VERSION=3
+    function setup() {
+      return {
+        input: ["B04", "B08"],
+        output: { bands: 3, sampleType: "AUTO" }
+      };
+    }
+    function evaluatePixel(sample) {
+      let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
 
-# Headers for API requests
-HEADERS = {
-    "Authorization": f"Bearer {SENTINEL_ACCESS_TOKEN}"
-}
+      // Color gradient for NDVI visualization
+      // Red (-1 to 0), Yellow (0 to 0.33), Green (0.33 to 1)
+      let red = 0.0;
+      let green = 0.0;
+      let blue = 0.0;
+
+      if (ndvi < 0) {
+        // Red for negative NDVI (water, buildings, etc.)
+        red = 1.0;
+        green = 0.0;
+        blue = 0.0;
+      } else if (ndvi < 0.33) {
+        // Transition from red to yellow to green
+        red = 1.0 - ndvi / 0.33;
+        green = ndvi / 0.33;
+        blue = 0.0;
+      } else {
+        // Transition from yellow to dark green
+        red = 0.0;
+        green = 0.8 - (ndvi - 0.33) * 0.5;
+        blue = 0.0;
+      }
+
+      return [red, green, blue];
+    }
+"""
+
+# NDVI histogram resolution: 0.01-wide bins over [-1, 1], so the 0.2 and 0.5
+# vegetation thresholds fall exactly on bin edges
+NDVI_BINS = 200
+NDVI_LOW_BIN = 120
+NDVI_HIGH_BIN = 150
+
+# Evalscript that reduces NDVI on Sentinel Hub's side: evaluatePixel accumulates
+# running totals and a histogram, and updateOutputMetadata returns them as
+# userData, so only a few hundred bytes of JSON come back instead of a raster
+NDVI_STATS_EVALSCRIPT = """
+    //VERSION=3
+    var count = 0, sum = 0, sumSq = 0, min = Infinity, max = -Infinity;
+    var hist = new Array(%(bins)d).fill(0);
+    
+    function setup() {
+      return {
+        input: ["B04", "B08", "dataMask"],
+        output: { bands: 1, sampleType: "FLOAT32" }
+      };
+    }
+    function evaluatePixel(sample) {
+      let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
+      if (sample.dataMask > 0 && isFinite(ndvi)) {
+        count += 1;
+        sum += ndvi;
+        sumSq += ndvi * ndvi;
+        min = Math.min(min, ndvi);
+        max = Math.max(max, ndvi);
+        let bin = Math.floor((ndvi + 1) * %(half_bins)d);
+        hist[Math.min(Math.max(bin, 0), %(last_bin)d)] += 1;
+      }
+      return [ndvi];
+    }
+    function updateOutputMetadata(scenes, inputMetadata, outputMetadata) {
+      outputMetadata.userData = {
+        count: count, sum: sum, sum_sq: sumSq, min: min, max: max, hist: hist
+      };
+    }
+""" % {"bins": NDVI_BINS, "half_bins": NDVI_BINS // 2, "last_bin": NDVI_BINS - 1}
+
+# Process API request kinds as (format, evalscript, response identifier),
+# indexed by the *_REQUEST ids so payload_bytes can key its cache on an int
+SENTINEL_REQUESTS = (
+    ("image/png", NDVI_IMAGE_EVALSCRIPT, "default"),
+    ("application/json", NDVI_STATS_EVALSCRIPT, "userdata"),
+)
+NDVI_IMAGE_REQUEST = 0
+NDVI_STATS_REQUEST = 1
+
+@functools.lru_cache(maxsize=512)
+def payload_bytes(parcel_geojson, date, script_id):
+    """
+    Serialized Process API request for a parcel, date and SENTINEL_REQUESTS id
+    
+    Memoized on the raw GeoJSON string, so repeat requests for a hot parcel
+    and date skip rebuilding and re-serializing the payload.
+    """
+    fmt, evalscript, identifier = SENTINEL_REQUESTS[script_id]
+    geometry = orjson.loads(parcel_geojson)["features"][0]["geometry"]
+    return orjson.dumps(build_payload(geometry, date, fmt, evalscript, identifier))
+
+def histogram_percentiles(hist, count, quantiles, mn, mx):
+    """Interpolate percentiles from an NDVI histogram, clamped to the observed range"""
+    cum = np.cumsum(hist)
+    targets = np.asarray(quantiles) * count
+    idx = np.minimum(np.searchsorted(cum, targets), NDVI_BINS - 1)
+    below = cum[idx] - hist[idx]
+    frac = (targets - below) / np.maximum(hist[idx], 1)
+    values = -1.0 + (idx + frac) * (2.0 / NDVI_BINS)
+    return np.clip(values, mn, mx)
+
+def compute_ndvi_stats(content):
+    """
+    Compute NDVI statistics from the userData reduction of NDVI_STATS_EVALSCRIPT
+    
+    Returns:
+        Dict of NDVI statistics, or None if the parcel has no valid pixels
+    """
+    reduction = orjson.loads(content)
+    count = reduction["count"]
+    if count == 0:
+        return None
+    
+    hist = np.asarray(reduction["hist"], dtype=np.int64)
+    mn, mx = reduction["min"], reduction["max"]
+    mean = reduction["sum"] / count
+    p10, median, p90 = histogram_percentiles(hist, count, (0.1, 0.5, 0.9), mn, mx)
+    return {
+        "mean": float(mean),
+        "median": float(median),
+        "std_dev": float(np.sqrt(max(reduction["sum_sq"] / count - mean * mean, 0.0))),
+        "min": float(mn),
+        "max": float(mx),
+        "p10": float(p10),
+        "p90": float(p90),
+        "count": int(count),
+        "area_distribution": {
+            "low_vegetation": float(hist[:NDVI_LOW_BIN].sum() / count),
+            "moderate_vegetation": float(hist[NDVI_LOW_BIN:NDVI_HIGH_BIN].sum() / count),
+            "high_vegetation": float(hist[NDVI_HIGH_BIN:].sum() / count)
+        },
+        "data_source": "Sentinel-2 L2A via Sentinel Hub"
+    }
+
+def ndvi_stats_cache_key(parcel_geojson, date):
+    """Cache key for the NDVI statistics of a parcel on one date"""
+    return sentinel_cache_key(parcel_geojson, date, "ndvi-stats", NDVI_STATS_EVALSCRIPT)
+
+def fetch_ndvi_stats(parcel_geojson, date):
+    """
+    Fetch NDVI statistics for a parcel and date
+    
+    Results are cached per parcel and date (False when there is no valid data),
+    so /ndvi-stats, /export-ndvi-csv and /ndvi-timeseries share them.
+    
+    Returns:
+        Dict of NDVI statistics, or None if the parcel has no valid pixels
+        
+    Raises:
+        SentinelHubError: If Sentinel Hub returns a non-200 response
+    """
+    key = ndvi_stats_cache_key(parcel_geojson, date)
+    stats = cache.get(key)
+    if stats is None:
+        response = sentinel_process(payload_bytes(parcel_geojson, date, NDVI_STATS_REQUEST))
+        
+        if response.status_code != 200:
+            raise SentinelHubError(response.status_code, response.text)
+        
+        stats = compute_ndvi_stats(response.content) or False
+        cache.set(key, stats)
+    return stats or None
+
+# Statistical API evalscript: Sentinel Hub computes the statistics and histogram
+# for each aggregation interval from the "ndvi" output
+NDVI_TIMESERIES_EVALSCRIPT = """
+    //VERSION=3
+    function setup() {
+      return {
+        input: [{ bands: ["B04", "B08", "dataMask"] }],
+        output: [
+          { id: "ndvi", bands: 1, sampleType: "FLOAT32" },
+          { id: "dataMask", bands: 1 }
+        ]
+      };
+    }
+    function evaluatePixel(sample) {
+      let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
+      let valid = sample.dataMask > 0 && isFinite(ndvi);
+      return { ndvi: [valid ? ndvi : 0], dataMask: [valid ? 1 : 0] };
+    }
+"""
+
+# Longest date span a single /ndvi-timeseries request may cover
+MAX_TIMESERIES_DAYS = 366
 
-# Additional token acquisition validation
-if SENTINEL_ACCESS_TOKEN == "default_access_token":
-    print("Warning: Could not obtain a valid Sentinel Hub access token. API requests may fail.")
+def statistical_ndvi_stats(band):
+    """
+    Convert one band of a Statistical API interval into the /ndvi-stats format
+    
+    Returns:
+        Dict of NDVI statistics, or None if the interval has no valid pixels
+    """
+    band_stats = band["stats"]
+    count = band_stats["sampleCount"] - band_stats["noDataCount"]
+    if count <= 0:
+        return None
+    
+    hist = np.array([b["count"] for b in band["histogram"]["bins"]], dtype=np.int64)
+    percentiles = band_stats["percentiles"]
+    return {
+        "mean": float(band_stats["mean"]),
+        "median": float(percentiles["50.0"]),
+        "std_dev": float(band_stats["stDev"]),
+        "min": float(band_stats["min"]),
+        "max": float(band_stats["max"]),
+        "p10": float(percentiles["10.0"]),
+        "p90": float(percentiles["90.0"]),
+        "count": int(count),
+        "area_distribution": {
+            "low_vegetation": float(hist[:NDVI_LOW_BIN].sum() / count),
+            "moderate_vegetation": float(hist[NDVI_LOW_BIN:NDVI_HIGH_BIN].sum() / count),
+            "high_vegetation": float(hist[NDVI_HIGH_BIN:].sum() / count)
+        },
+        "data_source": "Sentinel-2 L2A via Sentinel Hub"
+    }
+
+def fetch_ndvi_timeseries(parcel_geojson, dates):
+    """
+    Fetch NDVI statistics for several dates with one Statistical API request
+    
+    The request covers the span from the first to the last date in daily
+    intervals. Each requested date's result is cached under the same key
+    fetch_ndvi_stats uses.
+    
+    Args:
+        parcel_geojson: GeoJSON string containing the parcel geometry
+        dates: Sorted list of date strings in YYYY-MM-DD format
+        
+    Returns:
+        Dict mapping each date to its statistics, or None if it had no valid data
+        
+    Raises:
+        SentinelHubError: If Sentinel Hub returns a non-200 response
+    """
+    geometry = orjson.loads(parcel_geojson)["features"][0]["geometry"]
+    end = date.fromisoformat(dates[-1]) + timedelta(days=1)
+    payload = {
+        "input": {
+            "bounds": {"geometry": geometry},
+            "data": [{"type": "sentinel-2-l2a"}]
+        },
+        "aggregation": {
+            "timeRange": {
+                "from": f"{dates[0]}T00:00:00Z",
+                "to": f"{end:%Y-%m-%d}T00:00:00Z"
+            },
+            "aggregationInterval": {"of": "P1D"},
+            "width": 512,
+            "height": 512,
+            "evalscript": NDVI_TIMESERIES_EVALSCRIPT
+        },
+        "calculations": {
+            "ndvi": {
+                "histograms": {"default": {"nBins": NDVI_BINS, "lowEdge": -1.0, "highEdge": 1.0}},
+                "statistics": {"default": {"percentiles": {"k": [10, 50, 90]}}}
+            }
+        }
+    }
+    response = sentinel_process(payload, url=SENTINEL_STATISTICS_URL)
+    
+    if response.status_code != 200:
+        raise SentinelHubError(response.status_code, response.text)
+    
+    results = dict.fromkeys(dates)
+    failed = set()
+    for interval in orjson.loads(response.content).get("data", []):
+        day = interval["interval"]["from"][:10]
+        if day not in results:
+            continue
+        if "error" in interval:
+            failed.add(day)
+            continue
+        results[day] = statistical_ndvi_stats(interval["outputs"]["ndvi"]["bands"]["B0"])
+    
+    for day, stats in results.items():
+        if day not in failed:
+            cache.set(ndvi_stats_cache_key(parcel_geojson, day), stats or False)
+    return results
+
+# index.html is static, so read it once and serve the bytes with an ETag
+with open(os.path.join(app.root_path, "index.html"), "rb") as f:
+    INDEX_HTML = f.read()
+INDEX_ETAG = hashlib.blake2b(INDEX_HTML, digest_size=16).hexdigest()
 
 @app.route('/')
 def get_index():
     """Serve the main index.html file"""
-    with open("index.html", "r") as f:
-        return f.read()
+    response = Response(INDEX_HTML, mimetype="text/html")
+    response.set_etag(INDEX_ETAG, weak=True)
+    return response.make_conditional(request)
+
+# Error SVG split around its two text slots once at import, so building an
+# error response is a single bytes join
+_SVG_ERROR_HEAD, _SVG_ERROR_MID, _SVG_ERROR_TAIL = b"""<svg width="512" height="512" xmlns="http://www.w3.org/2000/svg">
+    <text x="256" y="256" font-family="Arial" font-size="24" text-anchor="middle" fill="white" stroke="#000000" stroke-width="0.5">
+        {TEXT}
+    </text>
+    <text x="256" y="290" font-family="Arial" font-size="16" text-anchor="middle" fill="#ff6666" stroke="#000000" stroke-width="0.3">
+        {TEXT}
+    </text>
+</svg>""".split(b"{TEXT}")
+
+def _svg_error(message, detail, status=500):
+    """Render an error message as a 512x512 SVG so image consumers still get an image"""
+    body = b"".join((
+        _SVG_ERROR_HEAD, html.escape(message).encode(),
+        _SVG_ERROR_MID, html.escape(detail).encode(),
+        _SVG_ERROR_TAIL
+    ))
+    return Response(body, status=status, mimetype="image/svg+xml")
 
 @app.route("/ndvi-image")
 def get_ndvi_image():
@@ -154,182 +814,37 @@ def get_ndvi_image():
             return Response("Missing required parameters: parcel_geojson, date", 
                            status=400, mimetype="text/plain")
         
-        # Never use demo mode - always try to use real data
-        use_demo_mode = False
-        
         print("Using real data from Sentinel Hub for NDVI image")
         
-        # This code is kept but will never execute
-        if False:
-            try:
-                # Parse the GeoJSON to get the polygon coordinates
-                geojson = json.loads(parcel_geojson)
-                coordinates = geojson["features"][0]["geometry"]["coordinates"][0]
-                
-                # SVG size and scaling
-                svg_width = 512
-                svg_height = 512
-                
-                # Find the bounding box of the coordinates
-                min_x = min(coord[0] for coord in coordinates)
-                max_x = max(coord[0] for coord in coordinates)
-                min_y = min(coord[1] for coord in coordinates)
-                max_y = max(coord[1] for coord in coordinates)
-                
-                # Create scaling factors (we flip y-axis since GeoJSON and SVG have different coordinate systems)
-                x_scale = svg_width / (max_x - min_x)
-                y_scale = svg_height / (max_y - min_y)
-                
-                # Generate the SVG polygon points
-                svg_points = ""
-                for coord in coordinates:
-                    x = (coord[0] - min_x) * x_scale
-                    # Invert y-axis (GeoJSON coordinates go up, SVG goes down)
-                    y = svg_height - (coord[1] - min_y) * y_scale
-                    svg_points += f"{x},{y} "
-                
-                # Create the SVG with the polygon shape filled with gradient and transparent background
-                svg = f"""<svg width="{svg_width}" height="{svg_height}" xmlns="http://www.w3.org/2000/svg">
-                    <defs>
-                        <linearGradient id="ndviGradient" x1="0%" y1="0%" x2="100%" y2="100%">
-                            <stop offset="0%" style="stop-color:rgb(255,0,0);stop-opacity:1" />
-                            <stop offset="33%" style="stop-color:rgb(255,255,0);stop-opacity:1" />
-                            <stop offset="100%" style="stop-color:rgb(0,128,0);stop-opacity:1" />
-                        </linearGradient>
-                    </defs>
-                    <polygon points="{svg_points}" fill="url(#ndviGradient)" stroke="#000000" stroke-width="1" />
-                    <text x="{svg_width/2}" y="{svg_height/2}" font-family="Arial" font-size="14" text-anchor="middle" fill="white" stroke="#000000" stroke-width="0.5">
-                        Demo NDVI Image (Sample Data)
-                    </text>
-                </svg>"""
-                
-                return Response(
-                    svg, 
-                    status=200, 
-                    mimetype="image/svg+xml"
-                )
-            except Exception as e:
-                # Fallback to a simple rectangle if there's an error with the polygon
-                print(f"Error creating SVG polygon: {str(e)}")
-                return Response(
-                    f"""<svg width="512" height="512" xmlns="http://www.w3.org/2000/svg">
-                        <defs>
-                            <linearGradient id="ndviGradient" x1="0%" y1="0%" x2="100%" y2="100%">
-                                <stop offset="0%" style="stop-color:rgb(255,0,0);stop-opacity:1" />
-                                <stop offset="33%" style="stop-color:rgb(255,255,0);stop-opacity:1" />
-                                <stop offset="100%" style="stop-color:rgb(0,128,0);stop-opacity:1" />
-                            </linearGradient>
-                        </defs>
-                        <rect x="50" y="50" width="412" height="412" fill="url(#ndviGradient)" stroke="#000000" stroke-width="1" />
-                        <text x="256" y="256" font-family="Arial" font-size="24" text-anchor="middle" fill="white" stroke="#000000" stroke-width="0.5">
-                            Demo NDVI Image (Sample Data)
-                        </text>
-                        <text x="256" y="290" font-family="Arial" font-size="12" text-anchor="middle" fill="#ff6666" stroke="#000000" stroke-width="0.2">
-                            Error: {str(e)}
-                        </text>
-                    </svg>""", 
-                    status=200, 
-                    mimetype="image/svg+xml"
-                )
-            
         # Proceed with API call for real data
-        geojson = json.loads(parcel_geojson)
-        payload = {
-            "input": {
-                "bounds": {"geometry": geojson["features"][0]["geometry"]},
-                "data": [{
-                    "type": "sentinel-2-l2a",
-                    "dataFilter": {"timeRange": {
-                        "from": f"{date}T00:00:00Z",
-                        "to": f"{date}T23:59:59Z"
-                    }}
-                }]
-            },
-            "output": {
-                "width": 512,
-                "height": 512,
-                "responses": [{"identifier": "default", "format": {"type": "image/png"}}]
-            },
-            "evalscript": """
-                //VERSION=3
-                function setup() {
-                  return {
-                    input: ["B04", "B08"],
-                    output: { bands: 3, sampleType: "AUTO" }
-                  };
-                }
-                function evaluatePixel(sample) {
-                  let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
-                  
-                  // Color gradient for NDVI visualization
-                  // Red (-1 to 0), Yellow (0 to 0.33), Green (0.33 to 1)
-                  let red = 0.0;
-                  let green = 0.0;
-                  let blue = 0.0;
-                  
-                  if (ndvi < 0) {
-                    // Red for negative NDVI (water, buildings, etc.)
-                    red = 1.0;
-                    green = 0.0;
-                    blue = 0.0;
-                  } else if (ndvi < 0.33) {
-                    // Transition from red to yellow to green
-                    red = 1.0 - ndvi / 0.33;
-                    green = ndvi / 0.33;
-                    blue = 0.0;
-                  } else {
-                    // Transition from yellow to dark green
-                    red = 0.0;
-                    green = 0.8 - (ndvi - 0.33) * 0.5;
-                    blue = 0.0;
-                  }
-                  
-                  return [red, green, blue];
-                }
-            """
-        }
+        try:
+            validate_parcel(orjson.loads(parcel_geojson))
+        except ValueError as e:
+            return Response(f"Invalid parcel_geojson: {e}", status=400, mimetype="text/plain")
         
         # Call the Sentinel Hub API
         try:
-            response = requests.post(SENTINEL_PROCESS_URL, json=payload, headers=HEADERS)
-            
-            if response.status_code != 200:
-                error_message = f"Error from Sentinel Hub API: {response.text}"
-                print(error_message)
-                return Response(error_message, status=response.status_code, mimetype="text/plain")
-                
+            chunks, length, close = stream_sentinel(parcel_geojson, date, NDVI_IMAGE_REQUEST)
             print("Successfully received image data from Sentinel Hub")
-            return Response(response.content, mimetype="image/png")
+            headers = {"Content-Length": length} if length else None
+            response = Response(stream_with_context(chunks), mimetype="image/png",
+                                headers=headers, direct_passthrough=True)
+            if close:
+                # Release the upstream stream even if the body is never iterated
+                response.call_on_close(close)
+            return response
             
+        except SentinelHubError as e:
+            error_message = f"Error from Sentinel Hub API: {e}"
+            print(error_message)
+            return Response(error_message, status=e.status_code, mimetype="text/plain")
         except Exception as e:
             print(f"Error connecting to Sentinel Hub API: {str(e)}")
-            return Response(
-                f"""<svg width="512" height="512" xmlns="http://www.w3.org/2000/svg">
-                    <text x="256" y="256" font-family="Arial" font-size="24" text-anchor="middle" fill="white" stroke="#000000" stroke-width="0.5">
-                        API Connection Error
-                    </text>
-                    <text x="256" y="290" font-family="Arial" font-size="16" text-anchor="middle" fill="#ff6666" stroke="#000000" stroke-width="0.3">
-                        {str(e)}
-                    </text>
-                </svg>""", 
-                status=500, 
-                mimetype="image/svg+xml"
-            )
+            return _svg_error("API Connection Error", str(e))
     except Exception as e:
         print(f"Error in get_ndvi_image: {str(e)}")
         # Return a fallback image for exceptions with transparent background
-        return Response(
-            """<svg width="512" height="512" xmlns="http://www.w3.org/2000/svg">
-                <text x="256" y="256" font-family="Arial" font-size="24" text-anchor="middle" fill="white" stroke="#000000" stroke-width="0.5">
-                    Error generating NDVI image
-                </text>
-                <text x="256" y="290" font-family="Arial" font-size="16" text-anchor="middle" fill="#ff6666" stroke="#000000" stroke-width="0.3">
-                    Please try another date or area
-                </text>
-            </svg>""", 
-            status=200, 
-            mimetype="image/svg+xml"
-        )
+        return _svg_error("Error generating NDVI image", "Please try another date or area", status=200)
 
 @app.route("/ndvi-stats")
 def get_ndvi_stats():
@@ -350,129 +865,22 @@ def get_ndvi_stats():
         if not parcel_geojson or not date:
             return {'error': 'Missing required parameters: parcel_geojson, date'}, 400
             
-        # Never use demo mode - always try to use real data
-        use_demo_mode = False
-        
         print("Using real data from Sentinel Hub for NDVI statistics")
         
-        # This code is kept but will never execute
-        if False:
-            # Demo mode - return sample statistics
-            return {
-                "message": "Demo mode - Using sample data",
-                "status": "demo_data",
-                "mean": 0.65,
-                "median": 0.68,
-                "std_dev": 0.15,
-                "min": 0.1,
-                "max": 0.9,
-                "p10": 0.45,
-                "p90": 0.85,
-                "count": 262144,
-                "area_distribution": {
-                    "low_vegetation": 0.1,
-                    "moderate_vegetation": 0.3,
-                    "high_vegetation": 0.6
-                }
-            }
-        
-        # If we're here, we're not in demo mode and can process real data
-        geojson = json.loads(parcel_geojson)
-        payload = {
-            "input": {
-                "bounds": {"geometry": geojson["features"][0]["geometry"]},
-                "data": [{
-                    "type": "sentinel-2-l2a",
-                    "dataFilter": {"timeRange": {
-                        "from": f"{date}T00:00:00Z",
-                        "to": f"{date}T23:59:59Z"
-                    }}
-                }]
-            },
-            "output": {
-                "width": 512,
-                "height": 512,
-                "responses": [{"identifier": "default", "format": {"type": "image/tiff"}}]
-            },
-            "evalscript": """
-                //VERSION=3
-                function setup() {
-                  return {
-                    input: ["B04", "B08"],
-                    output: { bands: 1 }
-                  };
-                }
-                function evaluatePixel(sample) {
-                  let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
-                  return [ndvi];
-                }
-            """
-        }
-            
-        response = requests.post(SENTINEL_PROCESS_URL, json=payload, headers=HEADERS)
+        try:
+            validate_parcel(orjson.loads(parcel_geojson))
+        except ValueError as e:
+            return {'error': f"Invalid parcel_geojson: {e}"}, 400
         
-        if response.status_code != 200:
-            return {'error': f"Error from Sentinel API: {response.text}"}, response.status_code
+        try:
+            stats = fetch_ndvi_stats(parcel_geojson, date)
+        except SentinelHubError as e:
+            return {'error': f"Error from Sentinel API: {e}"}, e.status_code
 
-        # Process data differently depending on rasterio availability
-        if RASTERIO_AVAILABLE:
-            try:
-                # Este código nunca se ejecutará ya que RASTERIO_AVAILABLE = False
-                pass
-            except Exception as e:
-                print(f"Rasterio processing failed: {str(e)}")
-                # Connection to API worked but rasterio processing failed
-                # Return estimated values based on typical agricultural data
-                # These are not demo/fake values but reasonable estimates from typical data
-                stats = {
-                    "mean": 0.61,
-                    "median": 0.64,
-                    "std_dev": 0.19,
-                    "min": 0.03,
-                    "max": 0.94,
-                    "p10": 0.38,
-                    "p90": 0.83,
-                    "count": 262144,
-                    "area_distribution": {
-                        "low_vegetation": 0.18,
-                        "moderate_vegetation": 0.32,
-                        "high_vegetation": 0.50
-                    },
-                    "data_source": "Sentinel Hub API (partial processing - rasterio error)",
-                    "processing_error": str(e)
-                }
-                return stats
-        else:
-            # Use alternative approach without rasterio
-            print("Rasterio not available, returning estimated NDVI values from API response")
-            
-            # Create statistics based on the API response
-            # These are realistic NDVI values for agricultural land
-            stats = {
-                "mean": 0.45,  # Typical agricultural land average
-                "median": 0.48,
-                "std_dev": 0.15,
-                "min": 0.12,
-                "max": 0.78,
-                "p10": 0.22,
-                "p90": 0.67,
-                "count": 250000,  # Typical pixel count for a field
-                "area_distribution": {
-                    "low_vegetation": 0.2,       # 20% low vegetation
-                    "moderate_vegetation": 0.45,  # 45% moderate vegetation
-                    "high_vegetation": 0.35       # 35% high vegetation
-                },
-                "data_source": "Sentinel Hub data (estimated values)"
-            }
-            
-            # We can retrieve additional information from the response headers
-            if 'content-length' in response.headers:
-                size = int(response.headers['content-length'])
-                # More data suggests more valid pixels
-                if size > 100000:
-                    stats["count"] = size // 4  # Approximate pixel count based on image size
-            
-            return stats
+        if stats is None:
+            return {'error': 'No valid NDVI data for the given parcel and date'}, 404
+        
+        return Response(orjson.dumps(stats), mimetype="application/json")
     except Exception as e:
         # If we encounter an exception, return an error message
         print(f"Error in get_ndvi_stats: {str(e)}")
@@ -481,6 +889,75 @@ def get_ndvi_stats():
             "error_details": str(e)
         }, 500
 
+@app.route("/ndvi-timeseries")
+def get_ndvi_timeseries():
+    """
+    Calculate NDVI statistics for a parcel on several dates with one Sentinel Hub call
+    
+    Args:
+        parcel_geojson: GeoJSON string containing the parcel geometry
+        dates: Comma-separated date strings in YYYY-MM-DD format
+        
+    Returns:
+        JSON array with one NDVI statistics object per requested date
+    """
+    try:
+        parcel_geojson = request.args.get('parcel_geojson')
+        dates_param = request.args.get('dates')
+        
+        if not parcel_geojson or not dates_param:
+            return {'error': 'Missing required parameters: parcel_geojson, dates'}, 400
+        
+        try:
+            dates = list(dict.fromkeys(
+                date.fromisoformat(d.strip()).isoformat()
+                for d in dates_param.split(",") if d.strip()
+            ))
+        except ValueError:
+            return {'error': 'Invalid date format. Use YYYY-MM-DD'}, 400
+        
+        if not dates:
+            return {'error': 'Missing required parameters: parcel_geojson, dates'}, 400
+        
+        if (date.fromisoformat(max(dates)) - date.fromisoformat(min(dates))).days >= MAX_TIMESERIES_DAYS:
+            return {'error': f"Dates must fall within {MAX_TIMESERIES_DAYS} days of each other"}, 400
+        
+        try:
+            validate_parcel(orjson.loads(parcel_geojson))
+        except ValueError as e:
+            return {'error': f"Invalid parcel_geojson: {e}"}, 400
+        
+        # Serve what we can from the per-date cache and fetch the rest in one call
+        results = {}
+        missing = []
+        for day in dates:
+            stats = cache.get(ndvi_stats_cache_key(parcel_geojson, day))
+            if stats is None:
+                missing.append(day)
+            else:
+                results[day] = stats or None
+        
+        if missing:
+            try:
+                results.update(fetch_ndvi_timeseries(parcel_geojson, sorted(missing)))
+            except SentinelHubError as e:
+                return {'error': f"Error from Sentinel API: {e}"}, e.status_code
+        
+        series = []
+        for day in dates:
+            if results[day]:
+                series.append({"date": day, **results[day]})
+            else:
+                series.append({"date": day, "error": "No valid NDVI data for this date"})
+        
+        return Response(orjson.dumps(series), mimetype="application/json")
+    except Exception as e:
+        print(f"Error in get_ndvi_timeseries: {str(e)}")
+        return {
+            "error": "Error processing NDVI data",
+            "error_details": str(e)
+        }, 500
+
 @app.route("/export-ndvi-csv")
 def export_ndvi_csv():
     """
@@ -501,93 +978,21 @@ def export_ndvi_csv():
             return Response("Missing required parameters: parcel_geojson, date", 
                            status=400, mimetype="text/plain")
         
-        # Check if required libraries are available
-        if not PANDAS_AVAILABLE:
-            return Response('Required library pandas not installed. Please install pandas for CSV export.', 
-                           status=500, mimetype="text/plain")
-        
-        # Never use demo mode - always try to use real data
-        use_demo_data = False
-        
         print("Using real data from Sentinel Hub for CSV export")
         
-        # This code is kept but will never execute
-        if False:
-            # Generate demo statistics 
-            stats = {
-                "message": "Demo mode - API key not configured",
-                "status": "demo_data",
-                "mean": 0.65,
-                "median": 0.68,
-                "std_dev": 0.15,
-                "min": 0.1,
-                "max": 0.9,
-                "p10": 0.45,
-                "p90": 0.85,
-                "count": 262144,
-                "area_distribution": {
-                    "low_vegetation": 0.1,
-                    "moderate_vegetation": 0.3,
-                    "high_vegetation": 0.6
-                }
-            }
-        else:
-            # Process real data through the API
-            geojson = json.loads(parcel_geojson)
-            payload = {
-                "input": {
-                    "bounds": {"geometry": geojson["features"][0]["geometry"]},
-                    "data": [{
-                        "type": "sentinel-2-l2a",
-                        "dataFilter": {"timeRange": {
-                            "from": f"{date}T00:00:00Z",
-                            "to": f"{date}T23:59:59Z"
-                        }}
-                    }]
-                },
-                "output": {
-                    "width": 512,
-                    "height": 512,
-                    "responses": [{"identifier": "default", "format": {"type": "image/tiff"}}]
-                },
-                "evalscript": """
-                    //VERSION=3
-                    function setup() {
-                      return {
-                        input: ["B04", "B08"],
-                        output: { bands: 1 }
-                      };
-                    }
-                    function evaluatePixel(sample) {
-                      let ndvi = (sample.B08 - sample.B04) / (sample.B08 + sample.B04);
-                      return [ndvi];
-                    }
-                """
-            }
-            response = requests.post(SENTINEL_PROCESS_URL, json=payload, headers=HEADERS)
-            
-            if response.status_code != 200:
-                return Response(f"Error from Sentinel API: {response.text}",
-                              status=response.status_code, mimetype="text/plain")
-            
-            # Como RASTERIO_AVAILABLE es siempre False, vamos directamente con el enfoque alternativo
-            print("CSV Export: Rasterio not available, using derived NDVI values")
-            stats = {
-                "mean": 0.63,
-                "median": 0.67,
-                "std_dev": 0.17,
-                "min": 0.04,
-                "max": 0.93,
-                "p10": 0.42,
-                "p90": 0.87,
-                "count": 262144,
-                "area_distribution": {
-                    "low_vegetation": 0.15,
-                    "moderate_vegetation": 0.38,
-                    "high_vegetation": 0.47
-                },
-                "data_source": "Sentinel Hub (derived values - rasterio unavailable)"
-            }
+        try:
+            validate_parcel(orjson.loads(parcel_geojson))
+        except ValueError as e:
+            return Response(f"Invalid parcel_geojson: {e}", status=400, mimetype="text/plain")
+        try:
+            stats = fetch_ndvi_stats(parcel_geojson, date)
+        except SentinelHubError as e:
+            return Response(f"Error from Sentinel API: {e}",
+                          status=e.status_code, mimetype="text/plain")
+        
+        if stats is None:
+            return Response("No valid NDVI data for the given parcel and date",
+                          status=404, mimetype="text/plain")
         
         # Create a flattened version of the stats for CSV export
         flat_stats = {
@@ -602,18 +1007,14 @@ def export_ndvi_csv():
             "pixel_count": stats["count"],
             "low_vegetation_pct": stats["area_distribution"]["low_vegetation"] * 100,
             "moderate_vegetation_pct": stats["area_distribution"]["moderate_vegetation"] * 100,
-            "high_vegetation_pct": stats["area_distribution"]["high_vegetation"] * 100
+            "high_vegetation_pct": stats["area_distribution"]["high_vegetation"] * 100,
+            "data_source": "Sentinel-2 satellite data"
         }
         
-        # Add demo indicator if using demo data
-        if use_demo_data:
-            flat_stats["data_source"] = "Demo data (sample values)"
-        else:
-            flat_stats["data_source"] = "Sentinel-2 satellite data"
-        
         buffer = io.StringIO()
-        pd.DataFrame([flat_stats]).to_csv(buffer, index=False)
-        buffer.seek(0)
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(flat_stats.keys())
+        writer.writerow(flat_stats.values())
         
         return Response(
             buffer.getvalue(), 
@@ -624,6 +1025,25 @@ def export_ndvi_csv():
         return Response(f"Error exporting CSV: {str(e)}", 
                        status=500, mimetype="text/plain")
 
+def send_form_page(filename):
+    """
+    Serve a static HTML form page from the static folder
+    
+    The ETag is marked weak because Flask-Compress appends the encoding to
+    strong ETags, which would stop the compressed page ever matching again
+    
+    Args:
+        filename: Name of the HTML file in the static folder
+    
+    Returns:
+        Flask response, 304 when the client's copy is current
+    """
+    response = send_from_directory(app.static_folder, filename, max_age=300)
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
 # User registration, login, and management routes
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -666,78 +1086,10 @@ def register():
         # Log the user in
         login_user(new_user)
         
-        return jsonify({'success': True, 'redirect': url_for('index')}), 200
+        return jsonify({'success': True, 'redirect': url_for('get_index')}), 200
         
-    # GET request - return registration form
-    return '''
-    <html>
-        <head>
-            <title>Register - AgriFlowNDVI</title>
-            <link rel="stylesheet" href="https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-        </head>
-        <body>
-            <div class="container mt-5">
-                <div class="row justify-content-center">
-                    <div class="col-md-6">
-                        <div class="card">
-                            <div class="card-header">
-                                <h3 class="mb-0">Register</h3>
-                            </div>
-                            <div class="card-body">
-                                <form id="registerForm">
-                                    <div class="mb-3">
-                                        <label for="username" class="form-label">Username</label>
-                                        <input type="text" class="form-control" id="username" name="username" required>
-                                    </div>
-                                    <div class="mb-3">
-                                        <label for="email" class="form-label">Email address</label>
-                                        <input type="email" class="form-control" id="email" name="email" required>
-                                    </div>
-                                    <div class="mb-3">
-                                        <label for="password" class="form-label">Password</label>
-                                        <input type="password" class="form-control" id="password" name="password" required>
-                                    </div>
-                                    <div id="errors" class="alert alert-danger d-none"></div>
-                                    <button type="submit" class="btn btn-primary w-100">Register</button>
-                                </form>
-                                <div class="mt-3 text-center">
-                                    Already have an account? <a href="/login">Log in</a>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            <script>
-                document.getElementById('registerForm').addEventListener('submit', async (e) => {
-                    e.preventDefault();
-                    const form = e.target;
-                    const formData = new FormData(form);
-                    
-                    try {
-                        const response = await fetch('/register', {
-                            method: 'POST',
-                            body: formData
-                        });
-                        
-                        const data = await response.json();
-                        
-                        if (data.success) {
-                            window.location.href = data.redirect;
-                        } else {
-                            const errorsDiv = document.getElementById('errors');
-                            errorsDiv.innerHTML = data.errors.join('<br>');
-                            errorsDiv.classList.remove('d-none');
-                        }
-                    } catch (error) {
-                        console.error('Error:', error);
-                    }
-                });
-            </script>
-        </body>
-    </html>
-    '''
+    # GET request - serve the static registration form
+    return send_form_page('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -750,126 +1102,230 @@ def login():
         user = User.query.filter_by(username=username).first()
         
         # Check if user exists and password is correct
-        if user and user.check_password(password):
+        if user and password and check_password_cached(user, password):
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
             if next_page:
                 return jsonify({'success': True, 'redirect': next_page}), 200
-            return jsonify({'success': True, 'redirect': url_for('index')}), 200
+            return jsonify({'success': True, 'redirect': url_for('get_index')}), 200
         
         return jsonify({'success': False, 'error': 'Invalid username or password'}), 401
     
-    # GET request - return login form
-    return '''
-    <html>
-        <head>
-            <title>Login - AgriFlowNDVI</title>
-            <link rel="stylesheet" href="https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-        </head>
-        <body>
-            <div class="container mt-5">
-                <div class="row justify-content-center">
-                    <div class="col-md-6">
-                        <div class="card">
-                            <div class="card-header">
-                                <h3 class="mb-0">Login</h3>
-                            </div>
-                            <div class="card-body">
-                                <form id="loginForm">
-                                    <div class="mb-3">
-                                        <label for="username" class="form-label">Username</label>
-                                        <input type="text" class="form-control" id="username" name="username" required>
-                                    </div>
-                                    <div class="mb-3">
-                                        <label for="password" class="form-label">Password</label>
-                                        <input type="password" class="form-control" id="password" name="password" required>
-                                    </div>
-                                    <div id="error" class="alert alert-danger d-none"></div>
-                                    <button type="submit" class="btn btn-primary w-100">Login</button>
-                                </form>
-                                <div class="mt-3 text-center">
-                                    Don't have an account? <a href="/register">Register</a>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            <script>
-                document.getElementById('loginForm').addEventListener('submit', async (e) => {
-                    e.preventDefault();
-                    const form = e.target;
-                    const formData = new FormData(form);
-                    
-                    try {
-                        const response = await fetch('/login', {
-                            method: 'POST',
-                            body: formData
-                        });
-                        
-                        const data = await response.json();
-                        
-                        if (data.success) {
-                            window.location.href = data.redirect;
-                        } else {
-                            const errorDiv = document.getElementById('error');
-                            errorDiv.textContent = data.error;
-                            errorDiv.classList.remove('d-none');
-                        }
-                    } catch (error) {
-                        console.error('Error:', error);
-                    }
-                });
-            </script>
-        </body>
-    </html>
-    '''
+    # GET request - serve the static login form
+    return send_form_page('login.html')
 
 @app.route('/logout')
 @login_required
 def logout():
     """Log out user"""
+    with _user_cache_lock:
+        _user_cache.pop(current_user.get_id(), None)
     logout_user()
     return redirect(url_for('login'))
 
 
+def ojsonify(payload):
+    """Build a JSON response with orjson, which serializes datetimes and dates natively"""
+    return Response(orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY),
+                    mimetype='application/json')
+
+# Row schemas for the list endpoints; msgspec encodes these natively, which is
+# much cheaper than building and serializing a dict per row
+class ParcelOut(msgspec.Struct):
+    id: int
+    name: str
+    description: str | None
+    geometry: dict
+    area_hectares: float | None
+    created_at: datetime
+    updated_at: datetime
+    
+    def __post_init__(self):
+        self.created_at = utc(self.created_at)
+        self.updated_at = utc(self.updated_at)
+
+class AnalysisOut(msgspec.Struct):
+    id: int
+    parcel_id: int
+    analysis_date: date
+    created_at: datetime
+    mean_ndvi: float
+    median_ndvi: float
+    min_ndvi: float
+    max_ndvi: float
+    std_dev_ndvi: float
+    percentile_10: float | None
+    percentile_90: float | None
+    low_vegetation: float | None
+    moderate_vegetation: float | None
+    high_vegetation: float | None
+    notes: str | None
+    
+    def __post_init__(self):
+        self.created_at = utc(self.created_at)
+
+class ParcelWithAnalysesOut(ParcelOut):
+    analyses: list[AnalysisOut]
+
+# Attribute getters in Struct field order, built once so serializing an ORM
+# instance is a single C-level call plus the positional Struct constructor
+_parcel_fields = operator.attrgetter(*ParcelOut.__struct_fields__)
+_analysis_fields = operator.attrgetter(*AnalysisOut.__struct_fields__)
+
+def parcel_out(parcel):
+    """Serialize a Parcel instance for the API"""
+    return ParcelOut(*_parcel_fields(parcel))
+
+def analysis_out(analysis):
+    """Serialize an NDVIAnalysis instance for the API"""
+    return AnalysisOut(*_analysis_fields(analysis))
+
+def out_columns(model, schema):
+    """Columns of model backing each field of an output Struct, in field order"""
+    return [getattr(model, field) for field in schema.__struct_fields__]
+
+_enc = msgspec.json.Encoder()
+
+def utc(dt):
+    """Mark a naive UTC timestamp from the database as UTC"""
+    return dt.replace(tzinfo=timezone.utc)
+
+def list_etag(*parts):
+    """ETag for a list endpoint from row counts and newest modification times"""
+    return hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+
+# Request body schemas, validated while msgspec parses the JSON. Optional
+# fields default to UNSET so updates can tell omitted fields from nulls.
+class ParcelIn(msgspec.Struct):
+    name: Annotated[str, msgspec.Meta(min_length=1)]
+    geometry: Annotated[dict, msgspec.Meta(min_length=1)]
+    description: str | None = ''
+    area_hectares: float | None = None
+
+class ParcelUpdate(msgspec.Struct):
+    name: Annotated[str, msgspec.Meta(min_length=1)] | msgspec.UnsetType = msgspec.UNSET
+    geometry: Annotated[dict, msgspec.Meta(min_length=1)] | msgspec.UnsetType = msgspec.UNSET
+    description: str | None | msgspec.UnsetType = msgspec.UNSET
+    area_hectares: float | None | msgspec.UnsetType = msgspec.UNSET
+
+class AnalysisIn(msgspec.Struct):
+    analysis_date: date
+    mean_ndvi: float | msgspec.UnsetType = msgspec.UNSET
+    median_ndvi: float | msgspec.UnsetType = msgspec.UNSET
+    min_ndvi: float | msgspec.UnsetType = msgspec.UNSET
+    max_ndvi: float | msgspec.UnsetType = msgspec.UNSET
+    std_dev_ndvi: float | msgspec.UnsetType = msgspec.UNSET
+    percentile_10: float | None | msgspec.UnsetType = msgspec.UNSET
+    percentile_90: float | None | msgspec.UnsetType = msgspec.UNSET
+    low_vegetation: float | None | msgspec.UnsetType = msgspec.UNSET
+    moderate_vegetation: float | None | msgspec.UnsetType = msgspec.UNSET
+    high_vegetation: float | None | msgspec.UnsetType = msgspec.UNSET
+    notes: str | None | msgspec.UnsetType = msgspec.UNSET
+
+# Bounded so one bulk upsert stays within SQLite's bound-parameter limit
+MAX_BULK_ANALYSES = 1000
+
+class AnalysesBulkIn(msgspec.Struct):
+    analyses: Annotated[list[AnalysisIn], msgspec.Meta(min_length=1, max_length=MAX_BULK_ANALYSES)]
+
+_parcel_in = msgspec.json.Decoder(ParcelIn)
+_parcel_update = msgspec.json.Decoder(ParcelUpdate)
+_analysis_in = msgspec.json.Decoder(AnalysisIn)
+_analyses_bulk_in = msgspec.json.Decoder(AnalysesBulkIn)
+
+def present_fields(struct):
+    """Fields of a decoded request Struct that were present in the body"""
+    return {k: v for k, v in msgspec.structs.asdict(struct).items() if v is not msgspec.UNSET}
+
 # API Routes for managing parcels
 @app.route('/api/parcels', methods=['GET'])
 @login_required
 def get_parcels():
-    """Get all parcels for the current user"""
-    parcels = Parcel.query.filter_by(user_id=current_user.id).all()
-    result = []
-    
-    for parcel in parcels:
-        result.append({
-            'id': parcel.id,
-            'name': parcel.name,
-            'description': parcel.description,
-            'geometry': json.loads(parcel.geometry),
-            'area_hectares': parcel.area_hectares,
-            'created_at': parcel.created_at.isoformat(),
-            'updated_at': parcel.updated_at.isoformat(),
-        })
+    """
+    Get all parcels for the current user
+    
+    With ?analyses_since=YYYY-MM-DD each parcel also embeds its analyses
+    from that date on, loaded for all parcels in one extra query.
+    """
+    since = None
+    if request.args.get('analyses_since'):
+        try:
+            since = date.fromisoformat(request.args['analyses_since'])
+        except ValueError:
+            return ojsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    # Cheap aggregate first, so an unchanged list is answered without loading rows
+    count, last_modified = db.session.query(
+        func.count(Parcel.id), func.max(Parcel.updated_at)
+    ).filter(Parcel.user_id == current_user.id).one()
+    etag_parts = [count, last_modified]
+    if since is not None:
+        etag_parts += [since, *db.session.query(
+            func.count(NDVIAnalysis.id), func.max(NDVIAnalysis.updated_at)
+        ).filter(
+            NDVIAnalysis.user_id == current_user.id,
+            NDVIAnalysis.analysis_date >= since
+        ).one()]
+    etag = list_etag(*etag_parts)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, must-revalidate'
+        return response
     
-    return jsonify(result)
+    if since is None:
+        # Plain column rows, no ORM instances, fed straight into the Struct
+        rows = db.session.execute(
+            select(*out_columns(Parcel, ParcelOut)).where(Parcel.user_id == current_user.id)
+        ).mappings()
+        result = [ParcelOut(**row) for row in rows]
+    else:
+        # selectinload fetches every parcel's analyses in a single IN query,
+        # narrowed to the requested dates by the loader criteria
+        parcels = db.session.execute(
+            select(Parcel).options(
+                selectinload(Parcel.analyses),
+                with_loader_criteria(
+                    NDVIAnalysis, lambda cls: cls.analysis_date >= since, include_aliases=True
+                )
+            ).where(Parcel.user_id == current_user.id)
+        ).scalars()
+        result = [
+            ParcelWithAnalysesOut(
+                *_parcel_fields(parcel),
+                analyses=[analysis_out(a) for a in parcel.analyses]
+            )
+            for parcel in parcels
+        ]
+    
+    response = Response(_enc.encode(result), mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, must-revalidate'
+    return response
 
 @app.route('/api/parcels', methods=['POST'])
 @login_required
 def create_parcel():
     """Create a new parcel"""
-    data = request.json
+    try:
+        data = _parcel_in.decode(request.get_data())
+    except msgspec.MsgspecError as e:
+        return ojsonify({'error': f"Invalid request body: {e}"}), 400
     
-    if not data or not data.get('name') or not data.get('geometry'):
-        return jsonify({'error': 'Missing required fields'}), 400
+    # Compute the area server-side; the client's value is only a fallback
+    area_hectares = geometry_area_hectares(data.geometry)
+    if area_hectares is None:
+        area_hectares = data.area_hectares
     
     # Create new parcel
     new_parcel = Parcel(
-        name=data['name'],
-        description=data.get('description', ''),
-        geometry=json.dumps(data['geometry']),
-        area_hectares=data.get('area_hectares'),
+        name=data.name,
+        description=data.description,
+        geometry=data.geometry,
+        area_hectares=area_hectares,
         user_id=current_user.id
     )
     
@@ -877,15 +1333,7 @@ def create_parcel():
     db.session.add(new_parcel)
     db.session.commit()
     
-    return jsonify({
-        'id': new_parcel.id,
-        'name': new_parcel.name,
-        'description': new_parcel.description,
-        'geometry': json.loads(new_parcel.geometry),
-        'area_hectares': new_parcel.area_hectares,
-        'created_at': new_parcel.created_at.isoformat(),
-        'updated_at': new_parcel.updated_at.isoformat(),
-    }), 201
+    return Response(_enc.encode(parcel_out(new_parcel)), status=201, mimetype='application/json')
 
 @app.route('/api/parcels/<int:parcel_id>', methods=['GET'])
 @login_required
@@ -894,17 +1342,9 @@ def get_parcel(parcel_id):
     parcel = Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first()
     
     if not parcel:
-        return jsonify({'error': 'Parcel not found'}), 404
-    
-    return jsonify({
-        'id': parcel.id,
-        'name': parcel.name,
-        'description': parcel.description,
-        'geometry': json.loads(parcel.geometry),
-        'area_hectares': parcel.area_hectares,
-        'created_at': parcel.created_at.isoformat(),
-        'updated_at': parcel.updated_at.isoformat(),
-    })
+        return ojsonify({'error': 'Parcel not found'}), 404
+    
+    return Response(_enc.encode(parcel_out(parcel)), mimetype='application/json')
 
 @app.route('/api/parcels/<int:parcel_id>', methods=['PUT'])
 @login_required
@@ -913,35 +1353,34 @@ def update_parcel(parcel_id):
     parcel = Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first()
     
     if not parcel:
-        return jsonify({'error': 'Parcel not found'}), 404
+        return ojsonify({'error': 'Parcel not found'}), 404
     
-    data = request.json
+    try:
+        data = present_fields(_parcel_update.decode(request.get_data()))
+    except msgspec.MsgspecError as e:
+        return ojsonify({'error': f"Invalid request body: {e}"}), 400
     
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
+        return ojsonify({'error': 'No data provided'}), 400
     
     # Update fields
     if 'name' in data:
         parcel.name = data['name']
     if 'description' in data:
         parcel.description = data['description']
+    area_hectares = None
     if 'geometry' in data:
-        parcel.geometry = json.dumps(data['geometry'])
-    if 'area_hectares' in data:
+        parcel.geometry = data['geometry']
+        area_hectares = geometry_area_hectares(data['geometry'])
+    if area_hectares is not None:
+        parcel.area_hectares = area_hectares
+    elif 'area_hectares' in data:
         parcel.area_hectares = data['area_hectares']
     
     # Save changes
     db.session.commit()
     
-    return jsonify({
-        'id': parcel.id,
-        'name': parcel.name,
-        'description': parcel.description,
-        'geometry': json.loads(parcel.geometry),
-        'area_hectares': parcel.area_hectares,
-        'created_at': parcel.created_at.isoformat(),
-        'updated_at': parcel.updated_at.isoformat(),
-    })
+    return Response(_enc.encode(parcel_out(parcel)), mimetype='application/json')
 
 @app.route('/api/parcels/<int:parcel_id>', methods=['DELETE'])
 @login_required
@@ -950,7 +1389,7 @@ def delete_parcel(parcel_id):
     parcel = Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first()
     
     if not parcel:
-        return jsonify({'error': 'Parcel not found'}), 404
+        return ojsonify({'error': 'Parcel not found'}), 404
     
     # Delete parcel
     db.session.delete(parcel)
@@ -959,40 +1398,102 @@ def delete_parcel(parcel_id):
     return '', 204
 
 
+# Analysis fields a client may set, with the value used when a new analysis omits them
+ANALYSIS_FIELDS = {
+    'mean_ndvi': 0,
+    'median_ndvi': 0,
+    'min_ndvi': 0,
+    'max_ndvi': 0,
+    'std_dev_ndvi': 0,
+    'percentile_10': None,
+    'percentile_90': None,
+    'low_vegetation': None,
+    'moderate_vegetation': None,
+    'high_vegetation': None,
+    'notes': None,
+}
+
+def dialect_insert(model):
+    """INSERT construct supporting ON CONFLICT for the configured database"""
+    if db.engine.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+def upsert_analyses(parcel_id, rows, update_fields):
+    """
+    Insert or update analyses of a parcel with one INSERT ... ON CONFLICT
+    
+    Args:
+        parcel_id: ID of a parcel owned by the current user
+        rows: Dicts holding analysis_date and every ANALYSIS_FIELDS value,
+            at most one per date
+        update_fields: Fields overwritten where an analysis already exists
+        
+    Returns:
+        Dict mapping each analysis date to (analysis id, whether an existing
+        analysis was updated); RETURNING order is not guaranteed, so results
+        are matched to rows by date
+    """
+    # A conflicting row keeps its original created_at, which tells updates apart
+    now = datetime.utcnow()
+    stmt = dialect_insert(NDVIAnalysis).values([
+        {**row, 'parcel_id': parcel_id, 'user_id': current_user.id, 'created_at': now, 'updated_at': now}
+        for row in rows
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['parcel_id', 'analysis_date'],
+        set_={**{field: stmt.excluded[field] for field in update_fields}, 'updated_at': now}
+    ).returning(NDVIAnalysis.id, NDVIAnalysis.analysis_date, NDVIAnalysis.created_at)
+    result = db.session.execute(stmt).all()
+    db.session.commit()
+    return {row.analysis_date: (row.id, row.created_at != now) for row in result}
+
 # API Routes for NDVI Analysis
 @app.route('/api/parcels/<int:parcel_id>/analyses', methods=['GET'])
 @login_required
 def get_analyses(parcel_id):
     """Get all NDVI analyses for a specific parcel"""
-    # Check if parcel exists and belongs to user
-    parcel = Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first()
+    # Filtering on the denormalized user_id doubles as the ownership check, so
+    # the parcel itself is only looked up when there are no analyses
+    count, last_modified = db.session.query(
+        func.count(NDVIAnalysis.id), func.max(NDVIAnalysis.updated_at)
+    ).filter(
+        NDVIAnalysis.parcel_id == parcel_id,
+        NDVIAnalysis.user_id == current_user.id
+    ).one()
     
-    if not parcel:
-        return jsonify({'error': 'Parcel not found'}), 404
-    
-    analyses = NDVIAnalysis.query.filter_by(parcel_id=parcel_id).all()
-    result = []
-    
-    for analysis in analyses:
-        result.append({
-            'id': analysis.id,
-            'parcel_id': analysis.parcel_id,
-            'analysis_date': analysis.analysis_date.isoformat(),
-            'created_at': analysis.created_at.isoformat(),
-            'mean_ndvi': analysis.mean_ndvi,
-            'median_ndvi': analysis.median_ndvi,
-            'min_ndvi': analysis.min_ndvi,
-            'max_ndvi': analysis.max_ndvi,
-            'std_dev_ndvi': analysis.std_dev_ndvi,
-            'percentile_10': analysis.percentile_10,
-            'percentile_90': analysis.percentile_90,
-            'low_vegetation': analysis.low_vegetation,
-            'moderate_vegetation': analysis.moderate_vegetation,
-            'high_vegetation': analysis.high_vegetation,
-            'notes': analysis.notes,
-        })
+    if not count and not Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first():
+        return ojsonify({'error': 'Parcel not found'}), 404
     
-    return jsonify(result)
+    etag = list_etag(count, last_modified)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, must-revalidate'
+        return response
+    
+    # Parcels can hold thousands of daily analyses, so stream the array in
+    # batches straight from the cursor instead of building it in memory
+    rows = db.session.execute(
+        select(*out_columns(NDVIAnalysis, AnalysisOut)).where(
+            NDVIAnalysis.parcel_id == parcel_id,
+            NDVIAnalysis.user_id == current_user.id
+        ).execution_options(yield_per=500)
+    ).mappings()
+    
+    def generate():
+        yield b"["
+        separator = b""
+        for batch in rows.partitions():
+            # Encode the batch as one array and drop its brackets
+            yield separator + _enc.encode([AnalysisOut(**row) for row in batch])[1:-1]
+            separator = b","
+        yield b"]"
+    
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, must-revalidate'
+    return response
 
 @app.route('/api/parcels/<int:parcel_id>/analyses', methods=['POST'])
 @login_required
@@ -1002,116 +1503,85 @@ def create_analysis(parcel_id):
     parcel = Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first()
     
     if not parcel:
-        return jsonify({'error': 'Parcel not found'}), 404
+        return ojsonify({'error': 'Parcel not found'}), 404
     
-    data = request.json
+    try:
+        data = present_fields(_analysis_in.decode(request.get_data()))
+    except msgspec.MsgspecError as e:
+        return ojsonify({'error': f"Invalid request body: {e}"}), 400
+    analysis_date = data.pop('analysis_date')
     
-    if not data or not data.get('analysis_date'):
-        return jsonify({'error': 'Missing required fields'}), 400
+    # Single-statement upsert on the (parcel_id, analysis_date) unique index;
+    # on conflict only the fields present in the request are overwritten
+    row = {**ANALYSIS_FIELDS, **data, 'analysis_date': analysis_date}
+    analysis_id, updated = upsert_analyses(parcel_id, [row], data)[analysis_date]
     
-    # Parse the date string to a date object
-    try:
-        analysis_date = datetime.strptime(data['analysis_date'], '%Y-%m-%d').date()
-    except ValueError:
-        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
-    
-    # Check if an analysis already exists for this date and parcel
-    existing_analysis = NDVIAnalysis.query.filter_by(
-        parcel_id=parcel_id,
-        analysis_date=analysis_date
-    ).first()
-    
-    # Update existing analysis if it exists
-    if existing_analysis:
-        existing_analysis.mean_ndvi = data.get('mean_ndvi', existing_analysis.mean_ndvi)
-        existing_analysis.median_ndvi = data.get('median_ndvi', existing_analysis.median_ndvi)
-        existing_analysis.min_ndvi = data.get('min_ndvi', existing_analysis.min_ndvi)
-        existing_analysis.max_ndvi = data.get('max_ndvi', existing_analysis.max_ndvi)
-        existing_analysis.std_dev_ndvi = data.get('std_dev_ndvi', existing_analysis.std_dev_ndvi)
-        existing_analysis.percentile_10 = data.get('percentile_10', existing_analysis.percentile_10)
-        existing_analysis.percentile_90 = data.get('percentile_90', existing_analysis.percentile_90)
-        existing_analysis.low_vegetation = data.get('low_vegetation', existing_analysis.low_vegetation)
-        existing_analysis.moderate_vegetation = data.get('moderate_vegetation', existing_analysis.moderate_vegetation)
-        existing_analysis.high_vegetation = data.get('high_vegetation', existing_analysis.high_vegetation)
-        existing_analysis.notes = data.get('notes', existing_analysis.notes)
-        
-        db.session.commit()
-        
-        return jsonify({
-            'id': existing_analysis.id,
+    if updated:
+        return ojsonify({
+            'id': analysis_id,
             'message': 'Analysis updated successfully',
             'updated': True
         })
     
-    # Create new analysis
-    new_analysis = NDVIAnalysis(
-        parcel_id=parcel_id,
-        analysis_date=analysis_date,
-        mean_ndvi=data.get('mean_ndvi', 0),
-        median_ndvi=data.get('median_ndvi', 0),
-        min_ndvi=data.get('min_ndvi', 0),
-        max_ndvi=data.get('max_ndvi', 0),
-        std_dev_ndvi=data.get('std_dev_ndvi', 0),
-        percentile_10=data.get('percentile_10'),
-        percentile_90=data.get('percentile_90'),
-        low_vegetation=data.get('low_vegetation'),
-        moderate_vegetation=data.get('moderate_vegetation'),
-        high_vegetation=data.get('high_vegetation'),
-        notes=data.get('notes')
-    )
-    
-    db.session.add(new_analysis)
-    db.session.commit()
-    
-    return jsonify({
-        'id': new_analysis.id,
+    return ojsonify({
+        'id': analysis_id,
         'message': 'Analysis saved successfully',
         'updated': False
     }), 201
 
+@app.route('/api/parcels/<int:parcel_id>/analyses/bulk', methods=['POST'])
+@login_required
+def create_analyses_bulk(parcel_id):
+    """
+    Save many NDVI analyses for a parcel in one statement and one commit
+    
+    Takes {"analyses": [...]} with the same fields as a single analysis.
+    Analyses for dates that already exist are replaced in full, with omitted
+    fields reset to their defaults; if a date repeats, the last entry wins.
+    Responds with the analysis id for each date, keyed by YYYY-MM-DD.
+    """
+    parcel = Parcel.query.filter_by(id=parcel_id, user_id=current_user.id).first()
+    
+    if not parcel:
+        return ojsonify({'error': 'Parcel not found'}), 404
+    
+    try:
+        data = _analyses_bulk_in.decode(request.get_data())
+    except msgspec.MsgspecError as e:
+        return ojsonify({'error': f"Invalid request body: {e}"}), 400
+    
+    rows = {}
+    for analysis in data.analyses:
+        rows[analysis.analysis_date] = {**ANALYSIS_FIELDS, **present_fields(analysis)}
+    
+    results = upsert_analyses(parcel_id, list(rows.values()), ANALYSIS_FIELDS)
+    updated = sum(1 for _, was_updated in results.values() if was_updated)
+    
+    return ojsonify({
+        'ids': {day.isoformat(): results[day][0] for day in rows},
+        'created': len(results) - updated,
+        'updated': updated
+    })
+
 @app.route('/api/analyses/<int:analysis_id>', methods=['GET'])
 @login_required
 def get_analysis(analysis_id):
     """Get a specific NDVI analysis"""
-    # Join with Parcel to ensure user owns the parcel
-    analysis = NDVIAnalysis.query.join(Parcel).filter(
-        NDVIAnalysis.id == analysis_id,
-        Parcel.user_id == current_user.id
-    ).first()
+    analysis = NDVIAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
     
     if not analysis:
-        return jsonify({'error': 'Analysis not found'}), 404
-    
-    return jsonify({
-        'id': analysis.id,
-        'parcel_id': analysis.parcel_id,
-        'analysis_date': analysis.analysis_date.isoformat(),
-        'created_at': analysis.created_at.isoformat(),
-        'mean_ndvi': analysis.mean_ndvi,
-        'median_ndvi': analysis.median_ndvi,
-        'min_ndvi': analysis.min_ndvi,
-        'max_ndvi': analysis.max_ndvi,
-        'std_dev_ndvi': analysis.std_dev_ndvi,
-        'percentile_10': analysis.percentile_10,
-        'percentile_90': analysis.percentile_90,
-        'low_vegetation': analysis.low_vegetation,
-        'moderate_vegetation': analysis.moderate_vegetation,
-        'high_vegetation': analysis.high_vegetation,
-        'notes': analysis.notes,
-    })
+        return ojsonify({'error': 'Analysis not found'}), 404
+    
+    return Response(_enc.encode(analysis_out(analysis)), mimetype='application/json')
 
 @app.route('/api/analyses/<int:analysis_id>', methods=['DELETE'])
 @login_required
 def delete_analysis(analysis_id):
     """Delete a specific NDVI analysis"""
-    # Join with Parcel to ensure user owns the parcel
-    analysis = NDVIAnalysis.query.join(Parcel).filter(
-        NDVIAnalysis.id == analysis_id,
-        Parcel.user_id == current_user.id
-    ).first()
+    analysis = NDVIAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
     
     if not analysis:
-        return jsonify({'error': 'Analysis not found'}), 404
+        return ojsonify({'error': 'Analysis not found'}), 404
     
     # Delete analysis
     db.session.delete(analysis)
@@ -1121,4 +1591,6 @@ def delete_analysis(analysis_id):
 
 # Run the Flask app when script is executed directly
 if __name__ == "__main__":
+    with app.app_context():
+        migrate_schema()
     app.run(host="0.0.0.0", port=5000, debug=True)
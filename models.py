@@ -1,12 +1,18 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-import json
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerifyMismatchError
 
 # Create instance of SQLAlchemy for models (initialized in main.py)
 db = SQLAlchemy()
 
+# Argon2id password hashing; hashes from before the switch are werkzeug
+# pbkdf2/scrypt strings and are upgraded on the next successful login
+password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+
 class User(UserMixin, db.Model):
     """User model for authentication and user management"""
     id = db.Column(db.Integer, primary_key=True)
@@ -17,15 +23,25 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     # Relationship with parcels
-    parcels = db.relationship('Parcel', backref='owner', lazy='dynamic')
+    parcels = db.relationship('Parcel', backref='owner', lazy='select')
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
         
     def check_password(self, password):
         """Check password against stored hash"""
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash.startswith('$argon2'):
+            return check_password_hash(self.password_hash, password)
+        try:
+            return password_hasher.verify(self.password_hash, password)
+        except (VerifyMismatchError, InvalidHashError):
+            return False
+    
+    def password_needs_rehash(self):
+        """Whether the stored hash is legacy or uses outdated Argon2 parameters"""
+        return (not self.password_hash.startswith('$argon2')
+                or password_hasher.check_needs_rehash(self.password_hash))
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -33,11 +49,17 @@ class User(UserMixin, db.Model):
 
 class Parcel(db.Model):
     """Field/Parcel model to store field boundaries"""
+    __table_args__ = (
+        # Every parcel lookup filters on owner and id
+        db.Index('ix_parcel_user_id', 'user_id', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    # GeoJSON stored as text
-    geometry = db.Column(db.Text, nullable=False)
+    # GeoJSON stored as JSONB on PostgreSQL (generic JSON elsewhere), so rows
+    # come back as parsed dicts without a Python-side parse
+    geometry = db.Column(db.JSON().with_variant(JSONB(), "postgresql"), nullable=False)
     area_hectares = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -46,15 +68,15 @@ class Parcel(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Relationship with NDVI analyses
-    analyses = db.relationship('NDVIAnalysis', backref='parcel', lazy='dynamic')
+    analyses = db.relationship('NDVIAnalysis', backref='parcel', lazy='select')
     
     def get_geometry_json(self):
         """Return geometry as parsed JSON"""
-        return json.loads(self.geometry)
+        return self.geometry
     
     def set_geometry_json(self, geometry_json):
         """Set geometry from JSON object"""
-        self.geometry = json.dumps(geometry_json)
+        self.geometry = geometry_json
         
     def __repr__(self):
         return f'<Parcel {self.name}>'
@@ -62,9 +84,15 @@ class Parcel(db.Model):
 
 class NDVIAnalysis(db.Model):
     """Model to store NDVI analysis results"""
+    __table_args__ = (
+        # At most one analysis per parcel and date
+        db.Index('ix_ndvi_parcel_date', 'parcel_id', 'analysis_date', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     analysis_date = db.Column(db.Date, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # NDVI statistics
     mean_ndvi = db.Column(db.Float, nullable=False)
@@ -89,5 +117,8 @@ class NDVIAnalysis(db.Model):
     # Foreign key to parcel
     parcel_id = db.Column(db.Integer, db.ForeignKey('parcel.id'), nullable=False)
     
+    # Owner of the parcel, denormalized so ownership checks need no join
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    
     def __repr__(self):
         return f'<NDVIAnalysis parcel_id={self.parcel_id} date={self.analysis_date}>'
\ No newline at end of file